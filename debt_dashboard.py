@@ -1,24 +1,44 @@
 
 import math
+import os
+import numpy as np
 import pandas as pd
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 import streamlit as st
-import matplotlib.pyplot as plt
+from numba import njit
 
 st.set_page_config(page_title="Debt Management Dashboard", layout="wide")
 st.title("Debt Management Dashboard")
 st.caption("Load your debts, tweak assumptions, and compare Snowball vs Avalanche strategies.")
 
+DEBTS_FILE = "debts.parquet"  # saved by wealth_dashboard.py; debts.csv is the starter data until then
+
 @st.cache_data
-def load_data(path):
-    df = pd.read_csv(path)
-    # Clean columns
-    for col in ["Rate", "Balance", "Payment", "Extra"]:
-        df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0.0)
+def load_data(path, mtime=None):
+    # mtime is only the cache key, so a debts.parquet saved by the wealth dashboard is read again
+    cols = ["Rate", "Balance", "Payment", "Extra"]
+    if isinstance(path, str) and path.endswith(".parquet"):
+        df = pd.read_parquet(path)
+        df[cols] = df[cols].apply(pd.to_numeric, errors="coerce").fillna(0.0)
+        return df
+    try:
+        # Parse the numeric columns as float64 up front; blank cells come in as NaN
+        df = pd.read_csv(path, dtype={col: "float64" for col in cols})
+    except ValueError:
+        # A non-numeric cell (e.g. "12%") fails the typed read: read untyped and coerce it to NaN
+        if hasattr(path, "seek"):
+            path.seek(0)
+        df = pd.read_csv(path)
+        df[cols] = df[cols].apply(pd.to_numeric, errors="coerce")
+    df[cols] = df[cols].fillna(0.0)
     return df
 
 uploaded = st.sidebar.file_uploader("Upload your debts CSV", type=["csv"])
-if uploaded is None:
+if uploaded is None and os.path.exists(DEBTS_FILE):
+    st.sidebar.info("No file uploaded. Using 'debts.parquet' as saved by the wealth dashboard. You can upload your own CSV anytime.")
+    df = load_data(DEBTS_FILE, os.path.getmtime(DEBTS_FILE))
+elif uploaded is None:
     st.sidebar.info("No file uploaded. Using the starter 'debts.csv'. You can replace it with your own CSV anytime.")
     df = load_data("debts.csv")
 else:
@@ -36,90 +56,159 @@ compounding = st.sidebar.selectbox("Compounding frequency", options=["Monthly"],
 min_floor = st.sidebar.number_input("Minimum payment floor per debt ($)", min_value=0.0, value=0.0, step=25.0, help="If a Payment is 0, enforce this minimum to avoid never-ending balances.")
 
 st.sidebar.header("Strategy")
-strategy = st.sidebar.radio("Choose strategy", ["Debt Snowball (smallest balance first)", "Debt Avalanche (highest rate first)"])
-
-def order_debts(d):
-    if strategy.startswith("Debt Snowball"):
-        return d.sort_values(["Balance", "Rate"], ascending=[True, False]).index.tolist()
-    else:
-        return d.sort_values(["Rate", "Balance"], ascending=[False, True]).index.tolist()
-
-def next_month(dt):
-    y, m = dt.year, dt.month
-    if m == 12:
-        return datetime(y+1, 1, dt.day)
-    # keep same day or clamp
-    try:
-        return datetime(y, m+1, dt.day)
-    except ValueError:
-        # end-of-month handling
-        return datetime(y, m+1, 1) - timedelta(days=1)
-
-def simulate(dframe: pd.DataFrame):
-    d = dframe.copy()
-    d["Balance"] = d["Balance"].astype(float)
-    d["Rate"] = d["Rate"].astype(float).fillna(0.0)
-    d["Payment"] = d["Payment"].astype(float).fillna(0.0)
-    d["Extra"] = d["Extra"].astype(float).fillna(0.0)
+STRATEGIES = ["Debt Snowball (smallest balance first)", "Debt Avalanche (highest rate first)"]
+strategy = st.sidebar.radio("Choose strategy", STRATEGIES)
+
+@njit(cache=True, nogil=True)
+def pick_focus(balance, rate):
+    """Return the Snowball focus debt (smallest balance, ties to the higher rate), or -1 if all are paid.
+
+    Only the arg-extremum over positive balances is needed, so this is a single
+    pass instead of a full sort. Avalanche walks its fixed rate order in
+    `_simulate_core` instead.
+    """
+    focus = -1
+    for i in range(balance.shape[0]):
+        if balance[i] <= 0.01:
+            continue
+        if focus < 0 or balance[i] < balance[focus] or (balance[i] == balance[focus] and rate[i] > rate[focus]):
+            focus = i
+    return focus
+
+@njit(cache=True, nogil=True)
+def _simulate_core(balance, rate, payment, extra, order, order_mode, extra_budget, min_floor, max_months):
+    """Run the monthly payoff loop in place on `balance`.
+
+    `order_mode` is 0 for Snowball and 1 for Avalanche; `order` holds the debt
+    positions sorted by descending rate (stable) and is only used for Avalanche.
+    Returns the number of simulated months plus per-month totals and the focus
+    debt position (-1 if none).
+    """
+    n = balance.shape[0]
+    hist_balance = np.empty(max_months)
+    hist_interest = np.empty(max_months)
+    hist_payment = np.empty(max_months)
+    hist_focus = np.empty(max_months, np.int32)
+
     # Ensure payments have a minimum
-    d.loc[d["Payment"] <= 0, "Payment"] = min_floor
+    for i in range(n):
+        if payment[i] <= 0:
+            payment[i] = min_floor
+
+    monthly_rate = rate / 12.0
 
-    history = []  # records per month
+    # Debts still above the payoff threshold, updated as balances cross it
+    active = 0
+    for i in range(n):
+        if balance[i] > 0.01:
+            active += 1
+
+    ptr = 0
     month = 0
-    current_date = datetime.combine(start_date, datetime.min.time())
+    while month < max_months and active > 0:
+        # Choose focus account for extra
+        if order_mode == 0:
+            # Snowball order follows the balances, which all move every month
+            focus = pick_focus(balance, rate)
+        else:
+            # Avalanche order is fixed by rate: advance past paid-off debts (the pointer
+            # is reset below when a paid-off debt becomes active again)
+            while ptr < n and balance[order[ptr]] <= 0.01:
+                ptr += 1
+            focus = -1
+            if ptr < n:
+                focus = order[ptr]
+                # Equal rates still go to the smaller balance
+                j = ptr + 1
+                while j < n and rate[order[j]] == rate[focus]:
+                    k = order[j]
+                    if balance[k] > 0.01 and balance[k] < balance[focus]:
+                        focus = k
+                    j += 1
 
-    while month < max_months and (d["Balance"] > 0.01).any():
-        # interest accrual
-        interest = d["Balance"] * (d["Rate"].fillna(0.0) / 12.0)
+        total_balance = 0.0
+        total_interest = 0.0
+        total_payment = 0.0
+        for i in range(n):
+            # interest accrual
+            interest = balance[i] * monthly_rate[i]
 
-        # Base payments (minimums)
-        base_pay = d["Payment"].clip(lower=0.0)
+            total_pay = max(payment[i], 0.0) + extra[i]
+            if i == focus and extra_budget > 0:
+                total_pay += extra_budget
 
-        # Choose focus account for extra
-        order = order_debts(d)
-        focus_idx = None
-        for i in order:
-            if d.loc[i, "Balance"] > 0.01:
-                focus_idx = i
-                break
-
-        extra_vec = pd.Series(0.0, index=d.index)
-        if focus_idx is not None and extra_budget > 0:
-            extra_vec.loc[focus_idx] = extra_budget
-
-        total_pay = base_pay + d["Extra"] + extra_vec
-
-        # Prevent overpay: payment cannot exceed balance + this month's interest
-        payoff_cap = d["Balance"] + interest
-        applied = total_pay.clip(upper=payoff_cap)
-
-        # Update balances
-        new_balance = d["Balance"] + interest - applied
-        new_balance = new_balance.clip(lower=0.0)
-
-        # Track history
-        history.append({
-            "Date": current_date,
-            "Month": month,
-            "Total Balance": new_balance.sum(),
-            "Total Interest This Month": float(interest.sum()),
-            "Total Payment This Month": float(applied.sum()),
-            "Focus Debt": d.loc[focus_idx, "Name"] if focus_idx is not None else ""
-        })
-
-        d["Balance"] = new_balance
+            # Prevent overpay: payment cannot exceed balance + this month's interest.
+            # The amount owed is computed once and feeds both the cap and the new balance.
+            owed = balance[i] + interest
+            applied = min(total_pay, owed)
+
+            new_balance = max(owed - applied, 0.0)
+            if balance[i] > 0.01 and new_balance <= 0.01:
+                active -= 1
+            elif balance[i] <= 0.01 and new_balance > 0.01:
+                # An unpaid dust balance can accrue back over the threshold; the Avalanche
+                # pointer may already be past it (or past its tie-mates), so rescan from the top
+                active += 1
+                ptr = 0
+            balance[i] = new_balance
+
+            total_balance += new_balance
+            total_interest += interest
+            total_payment += applied
+
+        hist_balance[month] = total_balance
+        hist_interest[month] = total_interest
+        hist_payment[month] = total_payment
+        hist_focus[month] = focus
         month += 1
-        current_date = next_month(current_date)
 
-    hist = pd.DataFrame(history)
+    return month, hist_balance, hist_interest, hist_payment, hist_focus
+
+@st.cache_data(show_spinner=False)
+def simulate(dframe: pd.DataFrame, extra_budget: float, min_floor: float, max_months: int, start_date, strategy: str):
+    # Structure-of-arrays state: one contiguous float64 copy per column, mutated by the kernel.
+    # NaNs are zeroed in place once here, so the kernel never sees them.
+    balance, rate, payment, extra = (
+        np.nan_to_num(dframe[col].to_numpy(dtype=np.float64, copy=True), copy=False, nan=0.0)
+        for col in ["Balance", "Rate", "Payment", "Extra"]
+    )
+    order = np.argsort(-rate, kind="stable").astype(np.int32)
+    order_mode = 0 if strategy.startswith("Debt Snowball") else 1
+    months, hist_balance, hist_interest, hist_payment, hist_focus = _simulate_core(
+        balance, rate, payment, extra,
+        order, order_mode, float(extra_budget), float(min_floor), int(max_months),
+    )
+
+    # Offset every month from the start date itself and clamp the day to that month's end,
+    # so a start on the 31st gives Feb 28 and then Mar 31 instead of drifting to the 28th
+    start = pd.Timestamp(start_date)
+    month_starts = start.to_datetime64().astype("datetime64[M]") + np.arange(months)
+    first_days = month_starts.astype("datetime64[D]")
+    month_lengths = ((month_starts + 1).astype("datetime64[D]") - first_days).astype(np.int64)
+    dates = pd.to_datetime(first_days + (np.minimum(start.day, month_lengths) - 1))
+
+    # Resolve focus positions to names in one fancy-index; -1 means no focus that month
+    focus = hist_focus[:months]
+    focus_names = np.where(focus >= 0, dframe["Name"].to_numpy()[focus], "")
+    hist = pd.DataFrame({
+        "Date": dates,
+        "Month": np.arange(months),
+        "Total Balance": hist_balance[:months],
+        "Total Interest This Month": hist_interest[:months],
+        "Total Payment This Month": hist_payment[:months],
+        "Focus Debt": focus_names,
+    })
     # Final stats per debt
     result = dframe.copy()
-    result["Ending Balance"] = d["Balance"]
+    result["Ending Balance"] = balance
     result["Is Paid"] = result["Ending Balance"] <= 0.01
 
     return hist, result
 
-hist, result = simulate(edited)
+# Run both strategies side by side; the kernel releases the GIL, so the threads overlap
+with ThreadPoolExecutor(max_workers=2) as pool:
+    runs = list(pool.map(lambda s: simulate(edited, extra_budget, min_floor, max_months, start_date, s), STRATEGIES))
+hist, result = runs[STRATEGIES.index(strategy)]
 
 # KPIs
 col1, col2, col3, col4 = st.columns(4)
@@ -133,23 +222,24 @@ col2.metric("Estimated Months to Payoff", f"{months_to_clear}")
 col3.metric("Total Interest Paid ($)", f"{total_interest:,.2f}")
 col4.metric("Total Payments Made ($)", f"{total_payment:,.2f}")
 
-# Charts (matplotlib, single-plot, no explicit colors)
+st.subheader("Snowball vs Avalanche")
+st.dataframe(pd.DataFrame([
+    {
+        "Strategy": name.split(" (")[0],
+        "Months to Payoff": int(h["Month"].max()) if not h.empty else 0,
+        "Total Interest Paid ($)": h["Total Interest This Month"].sum() if not h.empty else 0.0,
+        "Total Payments Made ($)": h["Total Payment This Month"].sum() if not h.empty else 0.0,
+    }
+    for name, (h, _) in zip(STRATEGIES, runs)
+]), hide_index=True, use_container_width=True)
+
+# Charts (st.line_chart, drawn client-side by Vega-Lite)
 if not hist.empty:
     st.subheader("Total Balance Over Time")
-    fig1, ax1 = plt.subplots()
-    ax1.plot(hist["Date"], hist["Total Balance"])
-    ax1.set_xlabel("Date")
-    ax1.set_ylabel("Total Balance ($)")
-    ax1.set_title("Total Balance Over Time")
-    st.pyplot(fig1)
+    st.line_chart(hist, x="Date", y="Total Balance", x_label="Date", y_label="Total Balance ($)")
 
     st.subheader("Monthly Interest Paid Over Time")
-    fig2, ax2 = plt.subplots()
-    ax2.plot(hist["Date"], hist["Total Interest This Month"])
-    ax2.set_xlabel("Date")
-    ax2.set_ylabel("Interest ($)")
-    ax2.set_title("Monthly Interest Paid Over Time")
-    st.pyplot(fig2)
+    st.line_chart(hist, x="Date", y="Total Interest This Month", x_label="Date", y_label="Interest ($)")
 
 st.subheader("Final Status by Debt")
 st.dataframe(result, use_container_width=True)
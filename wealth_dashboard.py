@@ -1,14 +1,18 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
 import datetime
 import calendar
+import html
+import os
 
 # ==========================
 # File paths
 # ==========================
 ASSETS_FILE = "assets.csv"
-DEBTS_FILE = "debts.csv"
+DEBTS_FILE = "debts.parquet"
+DEBTS_CSV_FILE = "debts.csv"  # legacy format, migrated to DEBTS_FILE on first load
 
 # ==========================
 # Utility functions
@@ -20,21 +24,99 @@ def load_assets():
     except:
         return pd.DataFrame(columns=["Name", "Owner", "Type", "Institution", "Value", "Rate of Return"])
 
-def load_debts():
+@st.cache_data(show_spinner=False)
+def load_debts_cached(mtime):
+    # mtime is only the cache key: a changed file gets a new key and is read again.
+    # Parquet keeps the column types, so no numeric/date coercion is needed here.
     try:
-        df = pd.read_csv(DEBTS_FILE)
-        df["Due Date"] = pd.to_datetime(df["Due Date"], errors='coerce')
-        df["Payment"] = pd.to_numeric(df["Payment"], errors='coerce').fillna(0)
+        df = pd.read_parquet(DEBTS_FILE)
+        df["Payment"] = df["Payment"].fillna(0.0)
         return df
     except:
         return pd.DataFrame(columns=["Name","Owner","Type","#Number","Creditor","Org Start Amount",
                                      "Start Date","Rate","Balance","Payment","Due Date","Extra","End Date"])
 
+def migrate_debts_csv():
+    cols = ["Rate", "Balance", "Payment"]
+    try:
+        df = pd.read_csv(DEBTS_CSV_FILE, dtype={col: "float64" for col in cols}, parse_dates=["Due Date"])
+    except ValueError:
+        # A non-numeric cell (e.g. "12%") fails the typed read: read untyped and coerce it to NaN
+        df = pd.read_csv(DEBTS_CSV_FILE, parse_dates=["Due Date"])
+        df[cols] = df[cols].apply(pd.to_numeric, errors="coerce")
+    save_debts(df)
+
+def debts_mtime():
+    try:
+        return os.path.getmtime(DEBTS_FILE)
+    except OSError:
+        return None
+
+def debts_csv_pending():
+    # A legacy debts.csv that has not been migrated yet; writing DEBTS_FILE now would hide its rows
+    return not os.path.exists(DEBTS_FILE) and os.path.exists(DEBTS_CSV_FILE)
+
+def load_debts():
+    if debts_csv_pending():
+        # Bad CSV contents (ValueError), unconvertible columns (pyarrow's ValueError/TypeError)
+        # or file access (OSError) leave the CSV in place and no parquet file; the migration
+        # is retried on the next load
+        try:
+            migrate_debts_csv()
+        except (ValueError, TypeError, OSError) as e:
+            st.error(f"Could not import {DEBTS_CSV_FILE}: {e}")
+    return load_debts_cached(debts_mtime())
+
+@st.cache_data(show_spinner=False)
+def payments_by_date(mtime):
+    # Built once per file version, like load_debts_cached: the Calendar looks up each day
+    # cell with datetime.date(year, month, day) instead of comparing the whole column.
+    # Payments are formatted and names HTML-escaped here too, so rendering a month only
+    # concatenates strings and one stray "<" can't break the whole grid.
+    df = load_debts_cached(mtime)
+    if df.empty:
+        return {}
+    items = pd.DataFrame({"Name": df["Name"].astype(str).map(html.escape),
+                          "_pay_str": df["Payment"].map("${:,.0f}".format)})
+    return dict(tuple(items.groupby(df["Due Date"].dt.date)))
+
 def save_assets(df):
     df.to_csv(ASSETS_FILE, index=False)
 
 def save_debts(df):
-    df.to_csv(DEBTS_FILE, index=False)
+    # Rows added from the Calendar form carry plain dates; store the column as datetime64
+    df = df.assign(**{"Due Date": pd.to_datetime(df["Due Date"], errors="coerce")})
+    df.to_parquet(DEBTS_FILE, index=False)
+    load_debts_cached.clear()
+    payments_by_date.clear()
+    # The Debts page reloads its session copy from disk on next render
+    st.session_state.pop("debts_df", None)
+
+def persist_debt_edits():
+    # on_click callback of the Debts "Save changes" button: patch the session copy with the
+    # editor's pending delta (row positions refer to the frame passed to the editor) and write it out.
+    # save_debts() drops the session copy, so the next render reloads the typed frame from disk.
+    delta = st.session_state.debts_editor
+    df = st.session_state.debts_df.copy()
+    for pos, changes in delta["edited_rows"].items():
+        for col, value in changes.items():
+            df.iat[int(pos), df.columns.get_loc(col)] = value
+    df = df.drop(index=df.index[delta["deleted_rows"]])
+    if delta["added_rows"]:
+        df = pd.concat([df, pd.DataFrame(delta["added_rows"], columns=df.columns)], ignore_index=True)
+    save_debts(df)
+    st.session_state.debts_saved = True
+    # Restart the editor from the patched frame so the same delta is not applied twice
+    del st.session_state.debts_editor
+
+def frame_hash(df):
+    # Per-row hashes (index included) as bytes: detects edits, deletions and row moves
+    # without a cell-by-cell equals()
+    return pd.util.hash_pandas_object(df, index=True).values.tobytes()
+
+@st.cache_data(show_spinner=False)
+def metric_card(label, value, fmt):
+    return f'<div class="metric-card">{label}<br><h3>{fmt.format(value)}</h3></div>'
 
 # ==========================
 # Page Setup
@@ -44,7 +126,9 @@ st.set_page_config(page_title="💰 Wealth Management Dashboard", layout="wide")
 # ==========================
 # CSS for Modern UI + Trendy Look
 # ==========================
-st.markdown("""
+@st.cache_data
+def load_css():
+    return """
 <style>
 body, .main { 
     background: linear-gradient(135deg, #e0f7fa, #ffe0b2); 
@@ -148,7 +232,9 @@ body, .main {
     .nav-item { padding:10px 15px; font-size:16px; }
 }
 </style>
-""", unsafe_allow_html=True)
+"""
+
+st.markdown(load_css(), unsafe_allow_html=True)
 
 st.markdown('<p class="big-title">💼 Wealth Management Dashboard</p>', unsafe_allow_html=True)
 
@@ -175,9 +261,12 @@ def assets_page():
     else:
         # Editable DataFrame
         st.subheader("📋 Asset Table (Editable)")
+        st.session_state.setdefault("assets_hash", frame_hash(df_assets))
         edited_df = st.data_editor(df_assets, num_rows="dynamic", use_container_width=True)
-        if not edited_df.equals(df_assets):
+        edited_hash = frame_hash(edited_df)
+        if edited_hash != st.session_state.assets_hash:
             save_assets(edited_df)
+            st.session_state.assets_hash = edited_hash
             st.success("Asset table updated and saved successfully!")
             df_assets = edited_df
         
@@ -185,8 +274,8 @@ def assets_page():
         total_assets = df_assets["Value"].sum()
         avg_return = df_assets["Rate of Return"].mean()
         c1, c2 = st.columns(2)
-        c1.markdown(f'<div class="metric-card">💰 Total Assets<br><h3>${total_assets:,.2f}</h3></div>', unsafe_allow_html=True)
-        c2.markdown(f'<div class="metric-card">📈 Avg Rate of Return<br><h3>{avg_return:.2f}%</h3></div>', unsafe_allow_html=True)
+        c1.markdown(metric_card("💰 Total Assets", total_assets, "${:,.2f}"), unsafe_allow_html=True)
+        c2.markdown(metric_card("📈 Avg Rate of Return", avg_return, "{:.2f}%"), unsafe_allow_html=True)
         
         # Pie Chart
         fig = px.pie(df_assets, names='Type', values='Value', color_discrete_sequence=px.colors.qualitative.Pastel)
@@ -196,91 +285,118 @@ def assets_page():
 # ==========================
 # Debts Page
 # ==========================
+@st.cache_data(show_spinner=False)
+def debt_bar_chart(df_hash, _df):
+    # Cached on frame_hash(df) alone; the leading underscore keeps Streamlit from hashing _df
+    fig = px.bar(_df, x="Creditor", y="Balance", color="Rate", text="Balance",
+                 color_continuous_scale=px.colors.sequential.Plasma)
+    # A fixed uirevision keeps the user's zoom/pan when the figure is re-sent after a save
+    fig.update_layout(title="Debt Balances by Creditor", title_x=0.5, paper_bgcolor='rgba(0,0,0,0)',
+                      uirevision="debts")
+    fig.update_traces(marker_line_width=0)
+    return fig
+
 def debts_page():
     st.markdown('<p class="section-header">💳 Debt Management</p>', unsafe_allow_html=True)
-    df = load_debts()
+    # Canonical frame lives in session state; it is read from disk once and reloaded
+    # after each save by persist_debt_edits()
+    if "debts_df" not in st.session_state:
+        st.session_state.debts_df = load_debts()
+    df = st.session_state.debts_df
     
     if df.empty:
-        st.info("No debts found. Create **debts.csv** with appropriate columns.")
+        st.info("No debts found. Add a payment on the Calendar page, or create **debts.csv** with appropriate columns to import it.")
     else:
         # Editable DataFrame
         st.subheader("📋 Debt Table (Editable)")
-        edited_df = st.data_editor(df, num_rows="dynamic", use_container_width=True)
-        if not edited_df.equals(df):
-            save_debts(edited_df)
+        # The fixed key keeps pending edits across reruns; nothing is written until Save
+        edited_df = st.data_editor(df, num_rows="dynamic", use_container_width=True, key="debts_editor")
+        has_changes = any(st.session_state.debts_editor.values())
+        st.button("💾 Save changes", disabled=not has_changes, on_click=persist_debt_edits)
+        if st.session_state.pop("debts_saved", False):
             st.success("Debt table updated and saved successfully!")
-            df = edited_df
+        df = edited_df
         
         # Metrics
-        total_debt = df["Balance"].sum()
-        avg_rate = pd.to_numeric(df["Rate"], errors="coerce").fillna(0).mean()
-        total_payment = df["Payment"].sum()
+        # One numeric conversion and one column-wise reduction; missing rates count as 0%
+        arr = df[["Balance", "Rate", "Payment"]].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=np.float64)
+        total_debt, rate_sum, total_payment = np.nansum(arr, axis=0)
+        avg_rate = rate_sum / len(arr) if arr.size else 0.0
         c1, c2, c3 = st.columns(3)
-        c1.markdown(f'<div class="metric-card">💸 Total Debt<br><h3>${total_debt:,.2f}</h3></div>', unsafe_allow_html=True)
-        c2.markdown(f'<div class="metric-card">📊 Avg Interest Rate<br><h3>{avg_rate:.2f}%</h3></div>', unsafe_allow_html=True)
-        c3.markdown(f'<div class="metric-card">💵 Monthly Payments<br><h3>${total_payment:,.2f}</h3></div>', unsafe_allow_html=True)
+        c1.markdown(metric_card("💸 Total Debt", total_debt, "${:,.2f}"), unsafe_allow_html=True)
+        c2.markdown(metric_card("📊 Avg Interest Rate", avg_rate, "{:.2f}%"), unsafe_allow_html=True)
+        c3.markdown(metric_card("💵 Monthly Payments", total_payment, "${:,.2f}"), unsafe_allow_html=True)
         
         # Bar Chart
-        fig = px.bar(df, x="Creditor", y="Balance", color="Rate", text="Balance",
-                     color_continuous_scale=px.colors.sequential.Plasma)
-        fig.update_layout(title="Debt Balances by Creditor", title_x=0.5, paper_bgcolor='rgba(0,0,0,0)')
-        st.plotly_chart(fig, use_container_width=True)
+        st.plotly_chart(debt_bar_chart(frame_hash(df), df), use_container_width=True)
 
 # ==========================
 # Calendar Page
 # ==========================
-def calendar_page():
-    st.markdown('<p class="section-header">📅 Debt Payment Calendar</p>', unsafe_allow_html=True)
-    df = load_debts()
-    
-    if df.empty:
-        st.info("No debts found. Please ensure debts.csv exists.")
-        return
-    
+@st.fragment
+def render_calendar(df):
+    # Month/year navigation reruns only this fragment, not the rest of the page
     today = datetime.date.today()
     year = st.selectbox("Year", range(today.year, today.year + 5), index=0)
     month = st.selectbox("Month", range(1, 13), index=today.month-1)
-    cal = calendar.Calendar(firstweekday=0)
-    month_days = cal.monthdayscalendar(year, month)
+    # Monday-first scaffold: day numbers padded with zeros to whole weeks
+    offset, ndays = calendar.monthrange(year, month)
+    month_days = np.pad(np.arange(1, ndays + 1), (offset, -(offset + ndays) % 7)).reshape(-1, 7)
     
     st.markdown(f"### {calendar.month_name[month]} {year}")
     
-    # Day names
+    # Day names, as one grid row lined up with the calendar grid below
     day_names = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
-    cols = st.columns(7)
-    for i, day_name in enumerate(day_names):
-        cols[i].markdown(f"**{day_name}**", unsafe_allow_html=True)
+    st.markdown('<div style="display:grid;grid-template-columns:repeat(7,1fr);gap:4px;font-weight:bold">'
+                + "".join(f"<div>{d}</div>" for d in day_names) + '</div>', unsafe_allow_html=True)
+    
+    # Payments grouped by due date once per file version (NaT dates are dropped)
+    by_date = payments_by_date(debts_mtime())
     
-    # Calendar grid with payments
+    # Calendar grid with payments, sent as a single CSS grid instead of one element per cell
+    cells = []
     for week in month_days:
-        cols = st.columns(7)
-        for i, day in enumerate(week):
+        for day in week:
             if day == 0:
-                cols[i].markdown('<div class="day-box"></div>', unsafe_allow_html=True)
+                cells.append('<div class="day-box"></div>')
             else:
-                day_date = datetime.date(year, month, day)
-                payments_today = df[df["Due Date"] == pd.to_datetime(day_date)]
-                items_html = ""
-                for idx, row in payments_today.iterrows():
-                    items_html += f'<div class="payment-item" style="background-color:#FF5733">{row.Name}: ${row.Payment:,.0f}</div>'
-                with cols[i]:
-                    st.markdown(f'<div class="day-box"><div class="day-header">{day}</div>{items_html}</div>', unsafe_allow_html=True)
-                    if st.button(f"Add/Edit Payment {day}", key=f"{day}_btn"):
-                        with st.form(f"form_{day}"):
-                            name = st.text_input("Name", "")
-                            creditor = st.text_input("Creditor", "")
-                            balance = st.number_input("Balance ($)", min_value=0.0)
-                            rate = st.number_input("Rate (%)", min_value=0.0)
-                            payment = st.number_input("Payment ($)", min_value=0.0)
-                            due_date_input = st.date_input("Due Date", day_date)
-                            submitted = st.form_submit_button("Save Payment")
-                            if submitted:
-                                new_row = {"Name": name, "Creditor": creditor, "Balance": balance,
-                                           "Rate": rate, "Payment": payment, "Due Date": due_date_input}
-                                df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
-                                save_debts(df)
-                                st.success("Payment saved successfully!")
-                                st.experimental_rerun()
+                payments = by_date.get(datetime.date(year, month, day))
+                items = "" if payments is None else (
+                    '<div class="payment-item" style="background-color:#FF5733">'
+                    + payments["Name"] + ': ' + payments["_pay_str"] + '</div>').str.cat()
+                cells.append(f'<div class="day-box"><div class="day-header">{day}</div>{items}</div>')
+    st.markdown('<div style="display:grid;grid-template-columns:repeat(7,1fr);gap:4px">'
+                + "".join(cells) + '</div>', unsafe_allow_html=True)
+    
+    with st.expander("➕ Add/Edit Payment"):
+        default_date = today if (today.year, today.month) == (year, month) else datetime.date(year, month, 1)
+        with st.form("payment_form"):
+            name = st.text_input("Name", "")
+            creditor = st.text_input("Creditor", "")
+            balance = st.number_input("Balance ($)", min_value=0.0)
+            rate = st.number_input("Rate (%)", min_value=0.0)
+            payment = st.number_input("Payment ($)", min_value=0.0)
+            due_date_input = st.date_input("Due Date", default_date)
+            # Saving would create DEBTS_FILE next to a debts.csv that failed to migrate
+            submitted = st.form_submit_button("Save Payment", disabled=debts_csv_pending())
+            if submitted:
+                new_row = {"Name": name, "Creditor": creditor, "Balance": balance,
+                           "Rate": rate, "Payment": payment, "Due Date": due_date_input}
+                df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
+                save_debts(df)
+                st.success("Payment saved successfully!")
+                st.rerun()
+
+def calendar_page():
+    st.markdown('<p class="section-header">📅 Debt Payment Calendar</p>', unsafe_allow_html=True)
+    df = load_debts()
+    
+    # With no debts the grid is still drawn (every lookup misses), so the form below
+    # can be used to add the first payment
+    if df.empty:
+        st.info("No debts found. Add a payment below, or create **debts.csv** to import it.")
+    
+    render_calendar(df)
 
 # ==========================
 # Render Selected Page